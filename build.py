@@ -1,27 +1,290 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
 # Author: Raphael Matto
 # https://github.com/raphaelmatto/flickr-archive
 # Created March 2019.
 
-from __future__ import division
-
 import os
 import re
+import sys
 import math
 import json
-import time
+import string
 import logging
+import functools
+import itertools
 import collections
+import multiprocessing
 from datetime import datetime
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 from PIL import Image
-from resizeimage import resizeimage
+
+# One libvips thread per worker process; must be set before
+# pyvips initializes libvips.
+os.environ.setdefault("VIPS_CONCURRENCY", "1")
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+# orjson parses and serializes several times faster than
+# the stdlib; fall back to json when it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _TWITTER_BOOTSTRAP = '<link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.3.1/css/bootstrap.min.css" integrity="sha384-ggOyR0iXCbMQv3Xipma34MD+dH/1fQ784/j6cY/iJTQUOhcWr7x9JvoRxT2MZw1T" crossorigin="anonymous">'
 _FLICKR_URL = "https://www.flickr.com"
 
+# Matches the image id in the three filename shapes Flickr
+# exports, e.g. 131099312_foo.jpg, foo_131099312_o.jpg, and
+# foo_131099312.jpg.
+_IMAGE_ID_RE = re.compile(r"^(\d+)_|_(\d+)_o|_(\d+)\.")
+
+_SUPPORTED_FORMATS = (".jpg", ".jpeg", ".JPG", ".JPEG", ".gif", ".GIF", ".png", ".PNG")
+
+# Splits a Flickr original filename into its nice name and
+# extension, e.g. fresh-crop_131099312_o.jpg.
+_ALBUM_IMAGE_RE = re.compile(r"(.*)_\d+_o.(\w+)")
+
+# Page templates, compiled once at import time instead of
+# being re-parsed by .format on every page. The bootstrap
+# link and styles never change, so they are inlined into
+# the template text.
+
+_PROFILE_STYLE = """
+    div {padding: 50px 160px 50px 160px;}
+    .img {
+        width: 300px;
+        height: 300px;
+        background-position: 50% 50%;
+        background-repeat: no-repeat;
+        background-size: cover;
+    }
+"""
+
+# Pages that show full-size images in a grid.
+_GRID_STYLE = """
+    .padding {
+        padding: 50px 160px 50px 160px;
+    }
+    * {
+        margin: 0;
+        padding: 0;
+    }
+    .imgbox {
+        display: grid;
+        height: 100%;
+    }
+    .center-fit {
+        max-width: 100%;
+        max-height: 100vh;
+        margin: auto;
+    }
+"""
+
+# Index pages that just list thumbnails.
+_LIST_STYLE = """
+    .padding {
+        padding: 50px 160px 50px 160px;
+    }
+    * {
+        margin: 0;
+    }
+"""
+
+# Like _GRID_STYLE, but flush with the top of the page.
+_IMAGE_STYLE = """
+    .padding {
+        padding: 0px 160px 50px 160px;
+    }
+    * {
+        margin: 0;
+        padding: 0;
+    }
+    .imgbox {
+        display: grid;
+        height: 100%;
+    }
+    .center-fit {
+        max-width: 100%;
+        max-height: 100vh;
+        margin: auto;
+    }
+"""
+
+_PROFILE_TMPL = string.Template("""
+    <html>
+        <head>
+            <title>
+            </title>
+            """ + _TWITTER_BOOTSTRAP + """
+            <style>
+                """ + _PROFILE_STYLE + """
+            </style>
+        </head>
+        <body>
+            <div>
+                <h1>$name</h1>
+                <hr>
+                <p>
+                    Albums: $albums<br>
+                    Tags: $tags<br>
+                    Favorites: $faves<br>
+                    Comments: $comments<br>
+                    Views: $views
+                </p>
+                <hr>
+                <h2>Details</h2>
+                City: $city<br>
+                Hometown: $hometown
+                <hr>
+                <h2>Profile</h2>
+                <p>
+                    $description
+                </p>
+            </div>
+        </body>
+    </html>
+""")
+
+_IMAGE_TMPL = string.Template("""
+    <html>
+        <head>
+            <title>
+            </title>
+            """ + _TWITTER_BOOTSTRAP + """
+            <style>
+                """ + _IMAGE_STYLE + """
+            </style>
+        </head>
+        <body>
+            <div class=padding>
+                <div class="imgbox">
+                    <img class="center-fit" src=$image_src>
+                </div>
+                <br>
+                <div align=center>
+                    <h1><a href=$flickr_link>$name</a></h1>
+                    <p>$date_taken</p>
+                    <p>$views views, $favorites favorites</p>
+                </div>
+                <hr>
+                <h2>Description</h2>
+                <p>$description</p>
+                <hr>
+                <h2>Comments ($num_comments)</h2>
+                $comments
+                <hr>
+                <h2>Albums</h2>
+                $albums
+                <hr>
+                <h2>Tags</h2>
+                $tags
+                <hr>
+                <h2>Groups</h2>
+                $groups
+                <hr>
+                <h2>Details</h2>
+                <p>
+                    Privacy: $privacy<br>
+                    People in the photo: $people<br>
+                    Location: $location<br>
+                    License: $license<br>
+                </p>
+                <hr>
+                <h2>Exif</h2>
+                <pre>$exif</pre>
+            </div>
+        </body>
+    </html>
+""")
+
+# The tag/album pages all share the same ~2 KB shell, so it
+# is pre-encoded to bytes once and written around a body-only
+# template, instead of being re-copied and re-encoded into
+# every rendered page.
+
+def _page_head(style):
+    return ("""
+    <html>
+        <head>
+            <title>
+            </title>
+            """ + _TWITTER_BOOTSTRAP + """
+            <style>
+                """ + style + """
+            </style>
+        </head>
+        <body>
+            <div class=padding>
+""").encode("utf-8")
+
+
+_GRID_PAGE_HEAD = _page_head(_GRID_STYLE)
+_LIST_PAGE_HEAD = _page_head(_LIST_STYLE)
+
+_PAGE_TAIL = b"""
+            </div>
+        </body>
+    </html>
+"""
+
+_TAG_BODY_TMPL = string.Template("""
+                <h1><a href=$url>$title</a></h1>
+                <hr>
+                <a href=../index.html>Home</a> / <a href=../tags-$page_num.html>Tags, page $page_num</a>
+                <hr>
+                <p>
+                    $photo_count photo$plural<br><br>
+                </p>
+                <div align=center class='imgbox'>
+                    $images
+                </div>
+""")
+
+_TAGS_PAGE_BODY_TMPL = string.Template("""
+                <h1>Tags, page $page_num</h1>
+                <hr>
+                <a href=index.html>Home</a>
+                <hr>
+                <center>$pages</center>
+                <hr>
+                $tags
+                <hr>
+                <center>$pages</center>
+""")
+
+_ALBUM_BODY_TMPL = string.Template("""
+                <h1><a href=$url>$title</a></h1>
+                <hr>
+                <a href=../index.html>Home</a> / <a href=../albums-$page_num.html>Albums, page $page_num</a>
+                <hr>
+                <p>
+                    $photo_count photo$plural<br><br>
+                    $description
+                </p>
+                <div align=center class='imgbox'>
+                    $images
+                </div>
+""")
+
+_ALBUMS_PAGE_BODY_TMPL = string.Template("""
+                <h1>Albums, page $page_num</h1>
+                <hr>
+                <a href=index.html>Home</a>
+                <hr>
+                <center>$pages</center>
+                <hr>
+                $albums
+                <hr>
+                <center>$pages</center>
+""")
+
 
 def _set_up_logging(logging_level=logging.DEBUG):
     if not os.path.exists("logs"):
@@ -53,89 +316,26 @@ def _create_dirs():
         - tags
     cache
     """
-    if not os.path.isdir("cache"):
-        os.makedirs("cache")
-        logging.info("Created cache folder.")
-
-    if not os.path.isdir("html"):
-        os.makedirs("html")
-        logging.info("Created html folder.")
-
-    if not os.path.isdir("html/images"):
-        os.makedirs("html/images")
-        logging.info("Created html/images folder.")
-
-    if not os.path.isdir("html/albums"):
-        os.makedirs("html/albums")
-        logging.info("Created html/albums folder.")
-
-    if not os.path.isdir("thumbnails"):
-        os.makedirs("thumbnails")
-
-    if not os.path.isdir("html/tags"):
-        os.makedirs("html/tags")
-        logging.info("Created html/tags folder.")
-
-    if not os.path.isdir("html/comments"):
-        os.makedirs("html/comments")
-        logging.info("Created html/comments folder.")
-
-    if not os.path.isdir("html/views"):
-        os.makedirs("html/views")
-        logging.info("Created html/views folder.")
-
-    if not os.path.isdir("html/favs"):
-        os.makedirs("html/favs")
-        logging.info("Created html/favs folder.")
+    dirs = (
+        "cache",
+        "html",
+        "html/images",
+        "html/albums",
+        "thumbnails",
+        "html/tags",
+        "html/comments",
+        "html/views",
+        "html/favs",
+    )
+    for dir in dirs:
+        if not os.path.isdir(dir):
+            logging.info("Creating %s folder ..." % dir)
+        os.makedirs(dir, exist_ok=True)
 
 
 def _create_profile_html(image_map):
     json_data = _get_json_data('account_profile.json')
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_bootstrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div>
-                    <h1>{name}</h1>
-                    <hr>
-                    <p>
-                        Albums: {albums}<br>
-                        Tags: {tags}<br>
-                        Favorites: {faves}<br>
-                        Comments: {comments}<br>
-                        Views: {views}
-                    </p>
-                    <hr>
-                    <h2>Details</h2>
-                    City: {city}<br>
-                    Hometown: {hometown}
-                    <hr>
-                    <h2>Profile</h2>
-                    <p>
-                        {description}
-                    </p>
-                </div>
-            </body>
-        </html>
-    """.format(
-        style="""
-            div {padding: 50px 160px 50px 160px;}
-            .img {
-                width: 300px;
-                height: 300px;
-                background-position: 50% 50%;
-                background-repeat: no-repeat;
-                background-size: cover;
-            }
-        """,
-        twitter_bootstrap=_TWITTER_BOOTSTRAP,
+    html = _PROFILE_TMPL.substitute(
         city=json_data["city"],
         hometown=json_data["hometown"],
         name=json_data['real_name'],
@@ -149,50 +349,94 @@ def _create_profile_html(image_map):
     _write_html(html, "./html/index.html", overwrite=True)
 
 
-def _create_thumbnail_images(image_map, overwrite=False):
-    for file in image_map.values():
-        _, ext = os.path.splitext(file)
-        supported_formats = [".jpg", ".jpeg", ".JPG", ".JPEG", ".gif", ".GIF", ".png", ".PNG"]
-        if ext not in supported_formats:
-            logging.info(
-                "%s with extension %s is not a supported format, skipping ..." % (file, ext)
-            )
-            continue
-        logging.info("Creating thumnail image for %s ..." % file)
-        if os.path.exists("thumbnails/%s" % file) and not overwrite:
-            logging.info("Thumbnail for %s already exists, skipping ..." % file)
-            continue
-        try:
-            with open("images/%s" % file, "r+b") as fh:
-                with Image.open(fh) as image:
-                    cover = resizeimage.resize_cover(image, [300, 300])
-                    cover.save("thumbnails/%s" % file, image.format)
-        except Exception as e:
-            logging.error(
-                "Couldn't create thumbnail for %s: %s" % (file, e.message)
+def _thumbnail_one(file):
+    """
+    Creates a single thumbnail image. Lives at module
+    scope so multiprocessing can pickle it. Returns a
+    (file, error) tuple so the parent can aggregate.
+    """
+    try:
+        if pyvips is not None:
+            thumbnail = pyvips.Image.thumbnail(
+                "images/%s" % file, 300, height=300, crop="centre"
             )
+            _, ext = os.path.splitext(file)
+            if ext.lower() in (".jpg", ".jpeg"):
+                thumbnail.write_to_file(
+                    "thumbnails/%s" % file + "[Q=85,optimize_coding,strip]"
+                )
+            else:
+                thumbnail.write_to_file("thumbnails/%s" % file)
+            return (file, None)
+        with open("images/%s" % file, "r+b") as fh:
+            with Image.open(fh) as image:
+                format = image.format
+                # For JPEGs, draft() enables libjpeg's DCT-domain
+                # shrink-on-load, so only ~1/8 of the pixels are
+                # decoded. For other formats it's a no-op.
+                image.draft("RGB", (600, 600))
+                image.thumbnail((300, 300), Image.LANCZOS, reducing_gap=2.0)
+                image.save("thumbnails/%s" % file, format, optimize=True)
+        return (file, None)
+    except Exception as e:
+        return (file, str(e))
 
 
 def _get_json_files(type):
     if type == "images":
-        return [x for x in os.listdir("json") if "photo_" in x]
+        return [e.name for e in os.scandir("json") if e.is_file() and "photo_" in e.name]
 
 
+@functools.lru_cache(maxsize=64)
 def _get_json_data(json_file):
+    if orjson is not None:
+        with open("json/%s" % json_file, "rb") as fh:
+            return orjson.loads(fh.read())
     with open("json/%s" % json_file) as fh:
-        return json.load(fh, strict=False, encoding="utf-8")
+        return json.load(fh, strict=False)
+
+
+def _write_json(obj, file_path, pretty=False):
+    """
+    Writes compact json by default — the cache files are
+    only read back by _get_cache, so indentation just costs
+    encoder time and bytes. Pass pretty=True when a human
+    needs to read the output.
+    """
+    logging.info("Writing %s ..." % file_path)
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        with open(file_path, "wb") as fh:
+            fh.write(orjson.dumps(obj, option=option))
+    else:
+        with open(file_path, "w") as fh:
+            json.dump(obj, fh, indent=4 if pretty else None)
 
 
 def _write_html(html, file_path, overwrite=True):
     try:
-        if os.path.exists(file_path) and not overwrite:
+        if not overwrite and os.path.exists(file_path):
             logging.info("%s already exists, skipping ..." % file_path)
             return
         logging.info("Writing %s ..." % file_path)
-        with open(file_path, "w") as fh:
-            fh.write(html)
+        # Write pre-encoded bytes so the text-mode codec and
+        # newline translation layers are skipped. Callers may
+        # pass a str, bytes, or a list of either, so shared
+        # fragments like the page shell stay encoded once.
+        if isinstance(html, (str, bytes)):
+            html = [html]
+        data = b"".join(
+            x if isinstance(x, bytes) else x.encode("utf-8") for x in html
+        )
+        # os.write on a raw fd puts the page on disk with one
+        # write(2), skipping the Python file-object layer.
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
     except Exception as e:
-        logging.error("Could not write %s: %s" % (file_path, e.message))
+        logging.error("Could not write %s: %s" % (file_path, str(e)))
 
 
 def _get_people(people):
@@ -202,19 +446,24 @@ def _get_people(people):
 
 
 def _get_exif(exif):
-    if type(exif) is dict:
-        for k, v in exif.items():
-            return "\n".join(
-                ["%s: %s" % (k, json.dumps(v, indent=4)) for k, v in exif.items()]
-            )
+    if not isinstance(exif, dict):
+        return ""
+    if orjson is not None:
+        return "\n".join(
+            "%s: %s" % (k, orjson.dumps(v, option=orjson.OPT_INDENT_2).decode("utf-8"))
+            for k, v in exif.items()
+        )
+    return "\n".join(
+        "%s: %s" % (k, json.dumps(v, indent=4)) for k, v in exif.items()
+    )
 
 
 def _get_tags(tags):
-    return "<br>".join(["<a href=../tags/{tag}.html>{tag_clean}</a>".format(tag_clean=x["tag"].encode("utf-8"), tag=x["tag"].encode("utf-8").replace("/", "-",).replace(" ", "-")) for x in tags])
+    return "<br>".join(["<a href=../tags/{tag}.html>{tag_clean}</a>".format(tag_clean=x["tag"], tag=x["tag"].replace("/", "-",).replace(" ", "-")) for x in tags])
 
 
 def _get_groups(group):
-    return "<br>".join(["<a href={url}>{name}</a>".format(url=x["url"].encode("utf-8"), name=x["name"].encode("utf-8")) for x in group])
+    return "<br>".join(["<a href={url}>{name}</a>".format(url=x["url"], name=x["name"]) for x in group])
 
 
 def _get_location(geo):
@@ -233,7 +482,7 @@ def _get_image_albums(albums):
 
 
 def _get_privacy(privacy):
-    return privacy.encode("utf-8")
+    return privacy
 
 
 def _create_image_map(write=False):
@@ -248,217 +497,186 @@ def _create_image_map(write=False):
     ... and optionaly writes it to disk.
     """
     logging.info("Mapping image ids to images ...")
-    images = os.listdir("images")
+    # scandir reuses the directory read instead of doing a
+    # stat per entry.
+    images = [e.name for e in os.scandir("images") if e.is_file()]
     map = {}
-    regexA = re.compile("^(\d+)_")
-    regexB = re.compile("_(\d+)_o")
-    regexC = re.compile("_(\d+)\.")
     for image in images:
-        found = False
-        match = re.search(regexA, image)
-        if match:
-            found = True
-            id = match.group(1)
-            map[id] = image
-        match = re.search(regexB, image)
-        if match:
-            found = True
-            id = match.group(1)
-            map[id] = image
-        match = re.search(regexC, image)
-        if match:
-            found = True
-            id = match.group(1)
+        # A filename can match more than one id shape (e.g.
+        # 20190312_102030_43289058234_o.jpg), so record every
+        # match, not just the leftmost one.
+        matched = False
+        for match in _IMAGE_ID_RE.finditer(image):
+            id = next(g for g in match.groups() if g)
             map[id] = image
-        if not found:
+            matched = True
+        if not matched:
             logging.debug("Can't get id for images/%s, skpping ..." % image)
     if write:
-        with open("./cache/map.json", "w") as fh:  
-            json.dump(map, fh, indent=4)
+        _write_json(map, "./cache/map.json")
     return map
 
 
+_MONTHS = (
+    "January", "February", "March", "April", "May", "June", "July",
+    "August", "September", "October", "November", "December",
+)
+
+
+@functools.lru_cache(maxsize=None)
 def _niceDate(date_string):
+    # Called once per comment and per image, so slice the
+    # fixed YYYY-MM-DD prefix directly instead of paying for
+    # strptime on every call; many dates repeat, hence the
+    # cache.
     try:
-        dt = datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
-    except:
+        year = int(date_string[0:4])
+        month = int(date_string[5:7])
+        day = int(date_string[8:10])
+    except ValueError:
         dt = datetime.strptime(date_string, '%Y-%m-%d %H: %M: %S')
-    return "%s %s, %s" % (dt.strftime("%B"), dt.day, dt.year)
+        year, month, day = dt.year, dt.month, dt.day
+    return "%s %s, %s" % (_MONTHS[month - 1], day, year)
 
 
 def _create_image_html(json_data, image_map):
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_boostrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div class=padding>
-                    <div class="imgbox">
-                        <img class="center-fit" src={image_src}>
-                    </div>
-                    <br>
-                    <div align=center>
-                        <h1><a href={flickr_link}>{name}</a></h1>
-                        <p>{date_taken}</p>
-                        <p>{views} views, {favorites} favorites</p>
-                    </div>
-                    <hr>
-                    <h2>Description</h2>
-                    <p>{description}</p>
-                    <hr>
-                    <h2>Comments ({num_comments})</h2>
-                    {comments}
-                    <hr>
-                    <h2>Albums</h2>
-                    {albums}
-                    <hr>
-                    <h2>Tags</h2>
-                    {tags}
-                    <hr>
-                    <h2>Groups</h2>
-                    {groups}
-                    <hr>
-                    <h2>Details</h2>
-                    <p>
-                        Privacy: {privacy}<br>
-                        People in the photo: {people}<br>
-                        Location: {location}<br>
-                        License: {license}<br>
-                    </p>
-                    <hr>
-                    <h2>Exif</h2>
-                    <pre>{exif}</pre>
-                </div>
-            </body>
-        </html>
-    """.format(
-        style="""
-            .padding {
-                padding: 0px 160px 50px 160px;
-            }
-            * {
-                margin: 0;
-                padding: 0;
-            }
-            .imgbox {
-                display: grid;
-                height: 100%;
-            }
-            .center-fit {
-                max-width: 100%;
-                max-height: 100vh;
-                margin: auto;
-            }
-        """,
+    html = _IMAGE_TMPL.substitute(
         location=_get_location(json_data.get("geo")),
         albums=_get_image_albums(json_data["albums"]),
         views=json_data["count_views"],
         license=json_data["license"],
         groups=_get_groups(json_data["groups"]),
         tags=_get_tags(json_data["tags"]),
-        description=json_data["description"].encode("utf-8"),
+        description=json_data["description"],
         favorites=json_data["count_faves"],
         flickr_link=json_data["photopage"],
         comments=_get_comments_html(json_data["comments"]),
         num_comments=json_data["count_comments"],
-        name=json_data["name"].encode("utf-8"),
-        twitter_boostrap=_TWITTER_BOOTSTRAP,
+        name=json_data["name"],
         image_src="../../images/%s" % image_map.get(json_data["id"]),
         date_taken=_niceDate(json_data["date_taken"]),
         people=_get_people(json_data["people"]),
-        count_comments=json_data["count_comments"],
-        rotation=json_data["rotation"],
-        date_imported=json_data["date_imported"],
-        tagging_permissions=json_data["tagging_permissions"],
-        exif=_get_exif(json_data.get("exif"),
+        exif=_get_exif(json_data.get("exif")),
         privacy=_get_privacy(json_data["privacy"]),
     )
     return html
 
 
+def _process_asset(json_file, image_map, existing_thumbnails, overwrite):
+    """
+    Per-asset worker: parses one photo json, then writes the
+    thumbnail and html page for that image in one go (so its
+    data is touched while still hot in the page cache), and
+    returns the values the parent needs to build the
+    tag/fav/view/comment indexes.
+    """
+    try:
+        json_data = _get_json_data(json_file)
+        file = image_map.get(json_data["id"])
+        if file:
+            _, ext = os.path.splitext(file)
+            if ext not in _SUPPORTED_FORMATS:
+                logging.info(
+                    "%s with extension %s is not a supported format, skipping ..." % (file, ext)
+                )
+            elif file in existing_thumbnails and not overwrite:
+                logging.info("Thumbnail for %s already exists, skipping ..." % file)
+            else:
+                _, error = _thumbnail_one(file)
+                if error:
+                    logging.error(
+                        "Couldn't create thumbnail for %s: %s" % (file, error)
+                    )
+        html = _create_image_html(json_data, image_map)
+        _write_html(
+            html,
+            "html/images/%s.html" % json_data["id"],
+            overwrite=overwrite,
+        )
+        return (
+            json_data["id"],
+            [tag["tag"] for tag in json_data["tags"]],
+            json_data["count_faves"],
+            json_data["count_views"],
+            json_data["count_comments"],
+        )
+    except Exception as e:
+        logging.exception(str(e))
+        return None
+
+
 def _create_images_html(image_map, overwrite=True):
     """
     Creates an html file for each known
     image in the images directory. Also writes
     a tags map and returns it.
     """
-    tags = {}
-    favs = {}
-    views = {}
-    comments = {}
+    tags = collections.defaultdict(list)
+    favs = collections.defaultdict(list)
+    views = collections.defaultdict(list)
+    comments = collections.defaultdict(list)
     json_files = _get_json_files("images")
-    for json_file in json_files:
-        # For testing.
-        # if "5055428455" not in json_file:
-        #     continue
-        try:
-            json_data = _get_json_data(json_file)
-            for tag in json_data["tags"]:
-                tags.setdefault(tag["tag"], [])
-                tags[tag["tag"]].append(json_data["id"])
-            favs.setdefault(json_data["count_faves"], [])
-            views.setdefault(json_data["count_views"], [])
-            comments.setdefault(json_data["count_comments"], [])
-            favs[json_data["count_faves"]].append(json_data["id"])
-            views[json_data["count_views"]].append(json_data["id"])
-            comments[json_data["count_comments"]].append(json_data["id"])
-            html = _create_image_html(json_data, image_map)
-            _write_html(
-                html,
-                "html/images/%s.html" % json_data["id"],
-                overwrite=overwrite,
-            )
-        except Exception as e:
-            logging.exception(e.message)
-
-    logging.info("Writing ./cache/tags.json ...")
-    with open("./cache/tags.json", "w") as fh:
-        json.dump(tags, fh, indent=4)
-
-    logging.info("Writing ./cache/favs.json ...")
-    with open("./cache/favs.json", "w") as fh:
-        json.dump(favs, fh, indent=4)
-
-    logging.info("Writing ./cache/views.json ...")
-    with open("./cache/views.json", "w") as fh:
-        json.dump(views, fh, indent=4)
-
-    logging.info("Writing ./cache/comments.json ...")
-    with open("./cache/comments.json", "w") as fh:
-        json.dump(comments, fh, indent=4)
+    # For testing.
+    # json_files = [x for x in json_files if "5055428455" in x]
+    # One directory listing instead of a stat per thumbnail.
+    existing_thumbnails = set(e.name for e in os.scandir("thumbnails"))
+    worker = functools.partial(
+        _process_asset,
+        image_map=image_map,
+        existing_thumbnails=existing_thumbnails,
+        overwrite=overwrite,
+    )
+    pool = multiprocessing.Pool(multiprocessing.cpu_count())
+    try:
+        for record in pool.imap_unordered(worker, json_files, chunksize=64):
+            if record is None:
+                continue
+            id, tag_names, count_faves, count_views, count_comments = record
+            for tag in tag_names:
+                tags[tag].append(id)
+            favs[count_faves].append(id)
+            views[count_views].append(id)
+            comments[count_comments].append(id)
+    finally:
+        pool.close()
+        pool.join()
+
+    tags = dict(tags)
+    favs = dict(favs)
+    views = dict(views)
+    comments = dict(comments)
+
+    _write_json(tags, "./cache/tags.json")
+    _write_json(favs, "./cache/favs.json")
+    _write_json(views, "./cache/views.json")
+    _write_json(comments, "./cache/comments.json")
 
     return tags, favs, views, comments
 
 
 def _get_comments_html(comments):
-    html = ""
+    parts = []
     for comment in comments:
-        html += """
+        parts.append("""
             <div style="font-size: 75%"><a href={flickr}/photos/{user}>{user}</a> on {date}</div>
             {comment}<br><br>
         """.format(
             flickr=_FLICKR_URL,
             user=comment["user"],
             date=_niceDate(comment["date"]),
-            comment=comment["comment"].encode('utf-8'),
-        )
-    return html
+            comment=comment["comment"],
+        ))
+    return "".join(parts)
 
 
 def _get_images_table(image_ids, image_map):
-    table = '<table cellpadding=10 border=0>'
+    parts = ['<table cellpadding=10 border=0>']
     count = 1
     for image_id in image_ids:
         try:
             if count == 0:
-                table += "<tr>"
-            table += """
+                parts.append("<tr>")
+            parts.append("""
                 <td>
                     <a href=../images/{id}.html><img src={url}></a>
                     <a href=../images/{id}.html>{id}</a>
@@ -468,22 +686,23 @@ def _get_images_table(image_ids, image_map):
             """.format(
                 url="../../thumbnails/%s" % image_map[image_id],
                 id=image_id,
-            )
+            ))
             if count == 4:
-                table += "</tr>"
+                parts.append("</tr>")
                 count = 0
             count += 1
         except Exception as e:
             logging.error(
                 "Could not find %s in image map: %s" % (
                     image_id,
-                    e.message,
+                    str(e),
                 )
             )
-    table += "</table>"
-    return table
+    parts.append("</table>")
+    return "".join(parts)
 
 
+@functools.lru_cache(maxsize=1)
 def _get_albums():
     return sorted(
         _get_json_data("albums.json")["albums"],
@@ -492,7 +711,7 @@ def _get_albums():
 
 
 def _get_album_table(albums, image_map):
-    table = '<table cellpadding=10 border=0>'
+    parts = ['<table cellpadding=10 border=0>']
     count = 1
     for album in albums:
         try:
@@ -503,10 +722,10 @@ def _get_album_table(albums, image_map):
                 "Could not find %s in image map to use as cover photo for %s: %s" % (
                     _id_from_url(album["cover_photo"]),
                     album["title"],
-                    e.message,
+                    str(e),
                 )
             )
-        table += """
+        parts.append("""
             {tr}
             <td>
                 <a href=./albums/{id}.html><img src={link}></a><br>
@@ -519,22 +738,22 @@ def _get_album_table(albums, image_map):
             id=album["id"],
             title=album["title"],
             num_photos=album["photo_count"],
-        )
+        ))
         if count == 4:
-            table += "</tr>"
+            parts.append("</tr>")
             count = 0
         count += 1
 
-    table += "</table>"
-    return table
+    parts.append("</table>")
+    return "".join(parts)
 
 
 def _get_tag_table(tags, image_map):
-    table = '<table cellpadding=10 border=0>'
+    parts = ['<table cellpadding=10 border=0>']
     count = 1
     for tag in tags:
         cover_photo = image_map[tag["images"][0]]  # First image in list.
-        table += """
+        parts.append("""
             {tr}
             <td>
                 <a href=./tags/{tag}.html><img src={link}></a><br>
@@ -544,51 +763,66 @@ def _get_tag_table(tags, image_map):
         """.format(
             tr="<tr>" if count == 0 else "",
             link="../thumbnails/%s" % cover_photo,
-            tag=tag["name"].encode('utf-8').replace("/", "-").replace(" ", "-"),
-            tag_clean=tag["name"].encode('utf-8'),
+            tag=tag["name"].replace("/", "-").replace(" ", "-"),
+            tag_clean=tag["name"],
             num_photos=len(tag["images"]),
-        )
+        ))
         if count == 4:
-            table += "</tr>"
+            parts.append("</tr>")
             count = 0
         count += 1
 
-    table += "</table>"
-    return table
+    parts.append("</table>")
+    return "".join(parts)
 
 
-def _get_table(type, types, image_map):
-    table = '<table cellpadding=10 border=0>'
-    count = 1
-    for i in types:
-        cover_photo = image_map[i["images"][0]]  # First image in list.
-        table += """
+_TYPE_TD_TMPL = """
             {tr}
             <td>
                 <a href=./{type}s/{num}.html><img src={link}></a><br>
                 <a href=./{type}s/{num}.html>{num} {type}s ({num_photos})</a><br>
             </td>
 
-        """.format(
+        """
+
+
+def _get_table(type, types, image_map):
+    parts = ['<table cellpadding=10 border=0>']
+    count = 1
+    for i in types:
+        cover_photo = image_map[i["images"][0]]  # First image in list.
+        parts.append(_TYPE_TD_TMPL.format(
             type=type,
             tr="<tr>" if count == 0 else "",
             link="../thumbnails/%s" % cover_photo,
             num=i["num"],
             num_photos=len(i["images"]),
-        )
+        ))
         if count == 4:
-            table += "</tr>"
+            parts.append("</tr>")
             count = 0
         count += 1
 
-    table += "</table>"
-    return table
+    parts.append("</table>")
+    return "".join(parts)
 
 
-def _create_tag_html(tag, page_num, image_map, overwrite):
+# image_map for pool workers. The map is large, so the
+# executors install it once per worker via initializer=
+# instead of pickling it into every submitted task.
+_worker_image_map = None
+
+
+def _init_worker_image_map(image_map):
+    global _worker_image_map
+    _worker_image_map = image_map
+
+
+def _create_tag_html(tag, page_num, overwrite):
     """
     Creates an html page for a tag.
     """
+    image_map = _worker_image_map
     if len(tag["images"]) > 30:
         images = _get_images_table(tag["images"], image_map)
     else:
@@ -597,152 +831,73 @@ def _create_tag_html(tag, page_num, image_map, overwrite):
     try:
         url="%s/search/?sort=date-taken-desc&safe_search=1&tags=%s&user_id=%s&view_all=1" % (
             _FLICKR_URL,
-            tag["name"].encode("utf-8").replace("/", "-").replace(" ", "-"),
+            tag["name"].replace("/", "-").replace(" ", "-"),
             _get_flickr_id(),
         )
     except Exception as e:
         logging.error(
             "Could not create Flickr link for %s: %s" % (
                 tag["name"],
-                e.message,
+                str(e),
             )
         )
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_boostrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div class=padding>
-                    <h1><a href={url}>{title}</a></h1>
-                    <hr>
-                    <a href=../index.html>Home</a> / <a href=../tags-{page_num}.html>Tags, page {page_num}</a>
-                    <hr>
-                    <p>
-                        {photo_count} photo{plural}<br><br>
-                    </p>
-                    <div align=center class='imgbox'>
-                        {images}
-                    </div>
-                </div>
-            </body>
-        </html>
-    """.format(
-        style="""
-            .padding {
-                padding: 50px 160px 50px 160px;
-            }
-            * {
-                margin: 0;
-                padding: 0;
-            }
-            .imgbox {
-                display: grid;
-                height: 100%;
-            }
-            .center-fit {
-                max-width: 100%;
-                max-height: 100vh;
-                margin: auto;
-            }
-        """,
+    body = _TAG_BODY_TMPL.substitute(
         plural="s" if int(len(tag["images"])) > 1 else "",
-        twitter_boostrap=_TWITTER_BOOTSTRAP,
-        title=tag["name"].encode("utf-8"),
+        title=tag["name"],
         page_num=page_num,
         photo_count=len(tag["images"]),
         url=url,
         images=images,
     )
     _write_html(
-        html,
-        "./html/tags/%s.html" % tag["name"].encode("utf-8").replace("/", "").replace(" ", "-"),
+        [_GRID_PAGE_HEAD, body, _PAGE_TAIL],
+        "./html/tags/%s.html" % tag["name"].replace("/", "").replace(" ", "-"),
         overwrite=overwrite,
     )
 
 
-def _create_tags_page(tags, page_num, num_pages, image_map, overwrite):
-        html = """
-            <html>
-                <head>
-                    <title>
-                    </title>
-                    {twitter_boostrap}
-                    <style>
-                        {style}
-                    </style>
-                </head>
-                <body>
-                    <div class=padding>
-                        <h1>Tags, page {page_num}</h1>
-                        <hr>
-                        <a href=index.html>Home</a>
-                        <hr>
-                        <center>{pages}</center>
-                        <hr>
-                        {tags}
-                        <hr>
-                        <center>{pages}</center>
-                    </div>
-                </body>
-            </html>
-        """.format(
+def _create_tags_page(tags, page_num, num_pages, overwrite):
+        body = _TAGS_PAGE_BODY_TMPL.substitute(
             page_num=page_num,
             pages="Pages: " + " | ".join(["<a href=tags-%s.html>%s</a>" % (x, x) for x in range(1, num_pages)]),
-            style="""
-                .padding {
-                    padding: 50px 160px 50px 160px;
-                }
-                * {
-                    margin: 0;
-                }
-                """,
-            twitter_boostrap=_TWITTER_BOOTSTRAP,
-            tags=_get_tag_table(tags, image_map),
+            tags=_get_tag_table(tags, _worker_image_map),
         )
-        _write_html(html, "./html/tags-%s.html" % str(page_num), overwrite=overwrite)
+        _write_html([_LIST_PAGE_HEAD, body, _PAGE_TAIL], "./html/tags-%s.html" % page_num, overwrite=overwrite)
 
 
 def _get_num_tags(tags):
-    count = 0
-    for num_images, _tags in tags.items():
-        count += len(_tags)
-    return count
+    return sum(map(len, tags.values()))
 
 
 def _create_tags_html(tags, image_map, overwrite=True):
     """
     Parses the tags dict and writes html for tags
     """
+    if not tags:
+        return
     tags_per_page = 200
-    cur_page_num = 1
-    count = 0
-    cur_page_tags = []
+    all_tags = [tag for _tags in tags.values() for tag in _tags]
+    # For testing.
+    # all_tags = [x for x in all_tags if x["name"] == "kids"]
     num_pages = int(math.ceil(_get_num_tags(tags) / tags_per_page))
-    for num_images, _tags in tags.items():
-        for tag in _tags:
-            # if not tag["name"] == "kids":
-            #     continue
-            count += 1
-            cur_page_tags.append(tag)
-            if count == tags_per_page:
-                _create_tags_page(cur_page_tags, cur_page_num, num_pages, image_map, overwrite)
-                cur_page_tags = []
-                count = 0
-                cur_page_num += 1
-            _create_tag_html(
-                tag,
-                cur_page_num,
-                image_map,
-                overwrite,
+    with ProcessPoolExecutor(
+        max_workers=multiprocessing.cpu_count(),
+        initializer=_init_worker_image_map,
+        initargs=(image_map,),
+    ) as executor:
+        futures = []
+        for i, tag in enumerate(all_tags):
+            page_num = i // tags_per_page + 1
+            futures.append(
+                executor.submit(_create_tag_html, tag, page_num, overwrite)
+            )
+        for page_num in range(1, num_pages + 1):
+            page_tags = all_tags[(page_num - 1) * tags_per_page:page_num * tags_per_page]
+            futures.append(
+                executor.submit(_create_tags_page, page_tags, page_num, num_pages, overwrite)
             )
-    if len(cur_page_tags) > 0:
-        _create_tags_page(cur_page_tags, cur_page_num, num_pages, image_map, overwrite)
+        for future in as_completed(futures):
+            future.result()
 
 
 def _create_album_html(album, page_num, image_map):
@@ -750,62 +905,28 @@ def _create_album_html(album, page_num, image_map):
         images = _get_images_table(album["photos"], image_map)
     else:
         images = "<br><br>".join(["<a href=../images/%s.html><img class='center-fit' src=../../images/%s></a>" % (x, image_map.get(x)) for x in album["photos"]])
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_boostrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div class=padding>
-                    <h1><a href={url}>{title}</a></h1>
-                    <hr>
-                    <a href=../index.html>Home</a> / <a href=../albums-{page_num}.html>Albums, page {page_num}</a>
-                    <hr>
-                    <p>
-                        {photo_count} photo{plural}<br><br>
-                        {description}
-                    </p>
-                    <div align=center class='imgbox'>
-                        {images}
-                    </div>
-                </div>
-            </body>
-        </html>
-    """.format(
-        style="""
-            .padding {
-                padding: 50px 160px 50px 160px;
-            }
-            * {
-                margin: 0;
-                padding: 0;
-            }
-            .imgbox {
-                display: grid;
-                height: 100%;
-            }
-            .center-fit {
-                max-width: 100%;
-                max-height: 100vh;
-                margin: auto;
-            }
-        """,
+    body = _ALBUM_BODY_TMPL.substitute(
         plural="s" if int(album["photo_count"]) > 1 else "",
-        date=time.strftime("%A %b %d, %Y", time.gmtime(int(album["last_updated"]))),
-        twitter_boostrap=_TWITTER_BOOTSTRAP,
         title=album["title"],
         page_num=page_num,
         photo_count=album["photo_count"],
-        description=album["description"].encode('utf-8'),
+        description=album["description"],
         url=album["url"],
         images=images,
     )
-    return html
+    return [_GRID_PAGE_HEAD, body, _PAGE_TAIL]
+
+
+def _create_album_page(album, page_num, overwrite):
+    """
+    Worker that renders and writes one album page.
+    """
+    html = _create_album_html(album, page_num, _worker_image_map)
+    _write_html(
+        html,
+        "./html/albums/%s.html" % album["id"],
+        overwrite=overwrite,
+    )
 
 
 def _create_albums_html(image_map, overwrite=True):
@@ -813,56 +934,28 @@ def _create_albums_html(image_map, overwrite=True):
     albums = _get_albums()
     albums_per_page = 100
     num_pages = int(math.ceil(len(albums) / albums_per_page))
-    for page_num in range(num_pages):
-        albums_on_page = albums[albums_per_page * page_num:albums_per_page * (page_num + 1)]
-        html = """
-            <html>
-                <head>
-                    <title>
-                    </title>
-                    {twitter_boostrap}
-                    <style>
-                        {style}
-                    </style>
-                </head>
-                <body>
-                    <div class=padding>
-                        <h1>Albums, page {page_num}</h1>
-                        <hr>
-                        <a href=index.html>Home</a>
-                        <hr>
-                        <center>{pages}</center>
-                        <hr>
-                        {albums}
-                        <hr>
-                        <center>{pages}</center>
-                    </div>
-                </body>
-            </html>
-        """.format(
-            page_num=page_num + 1,
-            pages="Pages: " + " | ".join(["<a href=albums-%s.html>%s</a>" % (x + 1, x + 1) for x in range(0, num_pages)]),
-            style="""
-                .padding {
-                    padding: 50px 160px 50px 160px;
-                }
-                * {
-                    margin: 0;
-                }
-                """,
-            twitter_boostrap=_TWITTER_BOOTSTRAP,
-            albums=_get_album_table(albums_on_page, image_map),
-        )
-        _write_html(html, "./html/albums-%s.html" % str(page_num + 1), overwrite=overwrite)
-
-        # Write html file(s) for each album
-        for album in albums_on_page:
-            html = _create_album_html(album, page_num + 1, image_map)
-            _write_html(
-                html,
-                "./html/albums/%s.html" % album["id"],
-                overwrite=overwrite,
+    with ProcessPoolExecutor(
+        max_workers=multiprocessing.cpu_count(),
+        initializer=_init_worker_image_map,
+        initargs=(image_map,),
+    ) as executor:
+        futures = []
+        for page_num in range(num_pages):
+            albums_on_page = albums[albums_per_page * page_num:albums_per_page * (page_num + 1)]
+            body = _ALBUMS_PAGE_BODY_TMPL.substitute(
+                page_num=page_num + 1,
+                pages="Pages: " + " | ".join(["<a href=albums-%s.html>%s</a>" % (x + 1, x + 1) for x in range(0, num_pages)]),
+                albums=_get_album_table(albums_on_page, image_map),
             )
+            _write_html([_LIST_PAGE_HEAD, body, _PAGE_TAIL], "./html/albums-%s.html" % (page_num + 1), overwrite=overwrite)
+
+            # Write html file(s) for each album
+            for album in albums_on_page:
+                futures.append(
+                    executor.submit(_create_album_page, album, page_num + 1, overwrite)
+                )
+        for future in as_completed(futures):
+            future.result()
 
 
 def _create_albums_symlinks(image_map):
@@ -872,25 +965,29 @@ def _create_albums_symlinks(image_map):
     each image in the album.
     """
     albums = _get_albums()
-    regex = re.compile("(.*)_\d+_o.(\w+)")
+    images_abs = os.path.abspath("images")
     for album in albums:
         dir = "albums/%s" % album["title"]
         if not os.path.isdir(dir):
             logging.info("Creating folder %s ..." % dir)
             os.makedirs(dir)
+        album_abs = os.path.abspath(dir)
+        # One directory listing instead of an lexists per photo.
+        existing = set(e.name for e in os.scandir(dir))
         for photo in album["photos"]:
             if photo == "0":
                 continue
             if photo not in image_map:
                 continue
-            match = re.search(regex, image_map[photo])
+            match = _ALBUM_IMAGE_RE.search(image_map[photo])
             if match:
                 nice_name = "%s.%s" % (match.group(1), match.group(2))
-                dst = os.path.abspath("albums/%s/%s" % (album["title"], nice_name))
-                if not os.path.lexists(dst):
-                    src = os.path.abspath("images/%s" % image_map[photo])
+                dst = os.path.join(album_abs, nice_name)
+                if nice_name not in existing:
+                    src = os.path.join(images_abs, image_map[photo])
                     logging.info("Linking %s to %s ..." % (src, dst))
                     os.symlink(src, dst)
+                    existing.add(nice_name)
                 else:
                     logging.info("%s already exists, skipping ..." % dst)
 
@@ -899,31 +996,28 @@ def _id_from_url(url):
     return url.split("/")[-1]
 
 
+def _load_cache_file(name):
+    with open("./cache/%s.json" % name, "rb") as fh:
+        data = fh.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def _get_cache():
     """
     Loads up cache files from disk, so we
     don't have to go through the images loop
-    while testing.
+    while testing. The files are independent, so
+    read + parse them in parallel.
     """
-
-    with open('./cache/tags.json') as fh:
-        tags = json.load(fh)
-
-    with open('./cache/favs.json') as fh:
-        favs = json.load(fh)
-
-    with open('./cache/views.json') as fh:
-        views = json.load(fh)
-
-    with open('./cache/comments.json') as fh:
-        comments = json.load(fh)
-
-    with open('./cache/map.json') as fh:
-        image_map = json.load(fh)
-
+    names = ("tags", "favs", "views", "comments", "map")
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        tags, favs, views, comments, image_map = executor.map(_load_cache_file, names)
     return tags, favs, views, comments, image_map
 
 
+@functools.lru_cache(maxsize=1)
 def _get_flickr_id():
     return _get_json_data('account_profile.json')["nsid"]
 
@@ -936,15 +1030,10 @@ def _sort_by_value_len(_dict):
         {'key2': ['value1', 'value2']},
     }
     """
-    to_sort = {}
-    for k, v in _dict.items():
-        if len(v) not in to_sort:
-            to_sort[len(v)] = [{"name": k, "images": v}]
-        else:
-            to_sort[len(v)].append({"name": k, "images": v})
+    items = sorted(_dict.items(), key=lambda kv: len(kv[1]), reverse=True)
     sorted_dict = collections.OrderedDict()
-    for k, v in sorted(to_sort.iteritems(), reverse=True):
-        sorted_dict[k] = v
+    for length, group in itertools.groupby(items, key=lambda kv: len(kv[1])):
+        sorted_dict[length] = [{"name": k, "images": v} for k, v in group]
     return sorted_dict
 
 
@@ -957,177 +1046,134 @@ def _combine_tags(tags):
     """
     clean_tags = {}
     for tag, images in tags.items():
-        tag = tag.lower()
-        if tag not in clean_tags:
-            clean_tags[tag] = list(images)
-        else:
-            clean_tags[tag].extend(list(images))
-            clean_tags[tag] = set(clean_tags[tag])
-            clean_tags[tag] = list(clean_tags[tag])
-    return clean_tags
+        # Interned keys let later dict lookups short-circuit
+        # on identity instead of comparing the whole string.
+        clean_tags.setdefault(sys.intern(tag.lower()), set()).update(images)
+    return {tag: list(images) for tag, images in clean_tags.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def _flickr_search_url(num_type):
+    return f"{_FLICKR_URL}/search/?sort=date-taken-desc&safe_search=1&tags={num_type}&user_id={_get_flickr_id()}&view_all=1"
 
 
-def _create_type_html(type, num_type, images, page_num, image_map, overwrite):
+def _create_type_html(type, num_type, images, page_num, overwrite):
     """
     Creates an html page for a tag.
     """
+    image_map = _worker_image_map
     num_images = len(images)
     if num_images > 30:
         images = _get_images_table(images, image_map)
     else:
-        images = "<br><br>".join(["<a href=../images/%s.html><img class='center-fit' src=../../images/%s></a>" % (x, image_map.get(x)) for x in images])
+        # Bind the bound method once so the loop skips the
+        # attribute lookup per image.
+        get = image_map.get
+        images = "<br><br>".join(
+            f"<a href=../images/{x}.html><img class='center-fit' src=../../images/{get(x)}></a>"
+            for x in images
+        )
     url = ""
     try:
-        url="%s/search/?sort=date-taken-desc&safe_search=1&tags=%s&user_id=%s&view_all=1" % (
-            _FLICKR_URL,
-            num_type,
-            _get_flickr_id(),
-        )
+        url = _flickr_search_url(num_type)
     except Exception as e:
         logging.error(
-            "Could not create Flickr link for %s number of %s: %s" % (
-                num_type,
-                type,
-                e.message,
-            )
+            "Could not create Flickr link for %s number of %s: %s",
+            num_type,
+            type,
+            e,
         )
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_boostrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div class=padding>
-                    <h1>{title}</h1>
-                    <hr>
-                    <a href=../index.html>Home</a> / <a href=../{type}s-{page_num}.html>Most {type}ed, page {page_num}</a>
-                    <hr>
-                    <p>
-                        {photo_count} photo{plural}<br><br>
-                    </p>
-                    <div align=center class='imgbox'>
-                        {images}
-                    </div>
-                </div>
-            </body>
-        </html>
-    """.format(
-        style="""
-            .padding {
-                padding: 50px 160px 50px 160px;
-            }
-            * {
-                margin: 0;
-                padding: 0;
-            }
-            .imgbox {
-                display: grid;
-                height: 100%;
-            }
-            .center-fit {
-                max-width: 100%;
-                max-height: 100vh;
-                margin: auto;
-            }
-        """,
-        type=type,
-        plural="s" if num_images > 1 else "",
-        twitter_boostrap=_TWITTER_BOOTSTRAP,
-        title="Photos with %s %ss" % (num_type, type),
-        page_num=page_num,
-        photo_count=num_images,
-        url=url,
-        images=images,
-    )
+    plural = "s" if num_images > 1 else ""
+    # Fragments go straight to _write_html, which joins them
+    # into one buffer and writes the page in a single write(2).
     _write_html(
-        html,
-        "./html/%ss/%s.html" % (type, num_type),
+        [
+            _GRID_PAGE_HEAD,
+            f"<h1><a href={url}>Photos with {num_type} {type}s</a></h1>",
+            "<hr>",
+            f"<a href=../index.html>Home</a> / <a href=../{type}s-{page_num}.html>Most {type}ed, page {page_num}</a>",
+            "<hr>",
+            f"<p>{num_images} photo{plural}<br><br></p>",
+            "<div align=center class='imgbox'>",
+            images,
+            "</div>",
+            _PAGE_TAIL,
+        ],
+        f"./html/{type}s/{num_type}.html",
         overwrite=overwrite,
     )
 
 
-def _create_types_page(type, cur_page_type, page_num, num_pages, image_map, overwrite):
-    html = """
-        <html>
-            <head>
-                <title>
-                </title>
-                {twitter_boostrap}
-                <style>
-                    {style}
-                </style>
-            </head>
-            <body>
-                <div class=padding>
-                    <h1>Most {type}ed, page {page_num}</h1>
-                    <hr>
-                    <a href=index.html>Home</a>
-                    <hr>
-                    <center>{pages}</center>
-                    <hr>
-                    {types}
-                    <hr>
-                    <center>{pages}</center>
-                </div>
-            </body>
-        </html>
-    """.format(
-        type=type,
-        page_num=page_num,
-        pages="Pages: " + " | ".join(["<a href=%ss-%s.html>%s</a>" % (type, x + 1, x + 1) for x in range(0, num_pages)]),
-        style="""
-            .padding {
-                padding: 50px 160px 50px 160px;
-            }
-            * {
-                margin: 0;
-            }
-            """,
-        twitter_boostrap=_TWITTER_BOOTSTRAP,
-        types=_get_table(type, cur_page_type, image_map),
+def _create_types_page(type, cur_page_type, page_num, nav, image_map, overwrite):
+    _write_html(
+        [
+            _LIST_PAGE_HEAD,
+            f"<h1>Most {type}ed, page {page_num}</h1>",
+            "<hr>",
+            "<a href=index.html>Home</a>",
+            "<hr>",
+            nav,
+            "<hr>",
+            _get_table(type, cur_page_type, image_map),
+            "<hr>",
+            nav,
+            _PAGE_TAIL,
+        ],
+        f"./html/{type}s-{page_num}.html",
+        overwrite=overwrite,
     )
-    _write_html(html, "./html/%ss-%s.html" % (type, str(page_num)), overwrite=overwrite)
 
 
 def _create_types_html(type, types, image_map, overwrite):
     """
     Creates html pages for comments.
     """
+    if not types:
+        return
     types_per_page = 100
-    cur_page_num = 1
-    count = 0
-    cur_page_types = []
-    num_pages = int(math.ceil(len(types.keys()) / types_per_page))
-    for num_types, images in types.items():
-        count += 1
-        cur_page_types.append({"num": num_types, "images": images})
-        if count == types_per_page:
-            _create_types_page(type, cur_page_types, cur_page_num, num_pages, image_map, overwrite)
-            cur_page_types = []
-            count = 0
-            cur_page_num += 1
-        _create_type_html(
-            type,
-            num_types,
-            images,
-            cur_page_num,
-            image_map,
-            overwrite,
-        )
-    if len(cur_page_types) > 0:
-        _create_types_page(type, cur_page_types, cur_page_num, num_pages, image_map, overwrite)
-
-
-def _key_to_int(_dict):
-    clean = {}
-    for k, v in _dict.items():
-        clean[int(k)] = v
-    return clean
+    items = list(types.items())
+    # Pure-int ceiling division; no float round trip, and
+    # small categories still get one page.
+    num_pages = -(-len(items) // types_per_page) or 1
+    # The page navigation is identical on every page of a
+    # category, so render and encode it once here; the bytes
+    # pass through _write_html without being re-encoded.
+    pages = "Pages: " + " | ".join(f"<a href={type}s-{i}.html>{i}</a>" for i in range(1, num_pages + 1))
+    nav = ("<center>%s</center>" % pages).encode("utf-8")
+    # This executor is created from the category threads in
+    # run(). Forking a multi-threaded process can clone a held
+    # lock (e.g. the logging handler's) into the child, which
+    # then deadlocks on its first log line — so start workers
+    # fresh with spawn instead of fork.
+    with ProcessPoolExecutor(
+        max_workers=multiprocessing.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker_image_map,
+        initargs=(image_map,),
+    ) as executor:
+        futures = []
+        for i, (num_types, images) in enumerate(items):
+            # Derive the page number from the index so types
+            # near a page boundary can't pick up a stale one.
+            page_num = i // types_per_page + 1
+            futures.append(
+                executor.submit(
+                    _create_type_html,
+                    type,
+                    num_types,
+                    images,
+                    page_num,
+                    overwrite,
+                )
+            )
+        for page_num in range(1, num_pages + 1):
+            chunk = items[(page_num - 1) * types_per_page:page_num * types_per_page]
+            if not chunk:
+                continue
+            cur_page_types = [{"num": k, "images": v} for k, v in chunk]
+            _create_types_page(type, cur_page_types, page_num, nav, image_map, overwrite)
+        for future in as_completed(futures):
+            future.result()
 
 
 def run():
@@ -1141,10 +1187,10 @@ def run():
 
     _create_dirs()
     image_map = _create_image_map(write=True)
+    # Writes thumbnails too, one fused pass per asset.
     tags, favs, views, comments = _create_images_html(image_map, overwrite=False)
     # tags, favs, views, comments, image_map = _get_cache()  # For testing.
 
-    _create_thumbnail_images(image_map, overwrite=False)
     _create_albums_symlinks(image_map)
     _create_profile_html(image_map)
     _create_albums_html(image_map)
@@ -1152,19 +1198,27 @@ def run():
     tags = _combine_tags(tags)
     tags = _sort_by_value_len(tags)
 
-    favs = _key_to_int(favs)
-    favs = collections.OrderedDict(reversed(sorted(favs.items())))
-
-    views = _key_to_int(views)
-    views = collections.OrderedDict(reversed(sorted(views.items())))
-
-    comments = _key_to_int(comments)
-    comments = collections.OrderedDict(reversed(sorted(comments.items())))
+    # Counts come back from the cache as strings; one pass
+    # converts and sorts descending. Plain dicts keep
+    # insertion order on Python 3.7+.
+    favs = dict(sorted(((int(k), v) for k, v in favs.items()), key=itemgetter(0), reverse=True))
+    views = dict(sorted(((int(k), v) for k, v in views.items()), key=itemgetter(0), reverse=True))
+    comments = dict(sorted(((int(k), v) for k, v in comments.items()), key=itemgetter(0), reverse=True))
 
     _create_tags_html(tags, image_map)
-    _create_types_html("fav", favs, image_map, overwrite=True)
-    _create_types_html("view", views, image_map, overwrite=True)
-    _create_types_html("comment", comments, image_map, overwrite=True)
+    # The three categories are independent and write-heavy,
+    # so run them concurrently; threads are enough since the
+    # GIL is released during the file writes.
+    categories = [
+        (type, types)
+        for type, types in (("fav", favs), ("view", views), ("comment", comments))
+        if types
+    ]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(
+            lambda args: _create_types_html(args[0], args[1], image_map, True),
+            categories,
+        ))
 
     logging.info("Done!")
 
@@ -1182,8 +1236,9 @@ if __name__ == "__main__":
         run()
     except Exception as e:
         logging.error(
-            "Something unexpected happened. Send %s to raphaelmatto@gmail.com for troubleshooting." % log
+            "Something unexpected happened. Send %s to raphaelmatto@gmail.com for troubleshooting.",
+            log,
         )
-        logging.error(e.message)
+        logging.error("%s", e)
         logging.exception("Got exception on main handler:")
         raise